@@ -0,0 +1,88 @@
+import atexit
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from typing import Any, Dict, Optional, Union
+
+try:
+    import orjson
+
+    def json_loads(data: Union[str, bytes]) -> Any:
+        return orjson.loads(data)
+
+    def json_dumps(obj: Any) -> bytes:
+        return orjson.dumps(obj)
+except ImportError:  # orjson is optional, used when installed
+    def json_loads(data: Union[str, bytes]) -> Any:
+        return json.loads(data)
+
+    def json_dumps(obj: Any) -> bytes:
+        return json.dumps(obj).encode()
+
+logger = logging.getLogger()
+
+DEFAULT_TTL = 3600  # seconds
+MAX_AGE = 7 * 24 * 3600  # seconds, entries not written for this long are dropped regardless of the TTL
+CACHE_DIR = os.path.join(os.getenv('XDG_CACHE_HOME', os.path.expanduser('~/.cache')), 'gha-cli')
+
+
+class DiskCache(object):
+    """Small JSON file cache persisting GitHub responses across CLI invocations.
+    Entries are dicts, stored with the time they were written (`ts`), and dropped once older than MAX_AGE.
+    Safe to use from multiple threads, changes are written once, when the process exits.
+    """
+
+    def __init__(self, name: str, ttl: int = DEFAULT_TTL):
+        self.path = os.path.join(CACHE_DIR, f'{name}.json')
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._data: Dict[str, Dict[str, Any]] = self._load()
+        self._dirty = False
+        atexit.register(self.save)
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        try:
+            with open(self.path, 'rb') as f:
+                return json_loads(f.read())
+        except (OSError, ValueError) as ex:
+            logger.debug('Could not load cache %s: %s', self.path, ex)
+            return dict()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Get an entry, whether it is fresh or not"""
+        return self._data.get(key)
+
+    def is_fresh(self, entry: Optional[Dict[str, Any]]) -> bool:
+        return entry is not None and time.time() - entry.get('ts', 0) < self.ttl
+
+    def set(self, key: str, **values: Any) -> None:
+        with self._lock:
+            self._data[key] = dict(values, ts=time.time())
+            self._dirty = True
+
+    def save(self) -> None:
+        with self._lock:
+            oldest = time.time() - MAX_AGE
+            expired = [key for key, entry in self._data.items() if entry.get('ts', 0) < oldest]
+            for key in expired:
+                del self._data[key]
+            if not self._dirty and not expired:
+                return
+            data = json_dumps(self._data)
+            self._dirty = False
+        try:
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            # Write to a temporary file and rename it, so concurrent runs never read a partially written cache
+            fd, tmp_path = tempfile.mkstemp(dir=CACHE_DIR, prefix=f'.{os.path.basename(self.path)}.')
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(data)
+                os.replace(tmp_path, self.path)
+            except OSError:
+                os.unlink(tmp_path)
+                raise
+        except OSError as ex:
+            logger.debug('Could not save cache %s: %s', self.path, ex)
@@ -1,117 +1,353 @@
 #!/usr/bin/env python3
+import base64
+import functools
+import itertools
 import logging
 import os
-from collections import namedtuple
-from typing import Optional, List, Set, Dict, Union, Any
+import random
+import re
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Optional, List, Set, Dict, Union, Any, Tuple, Iterable, Callable
 
 import click
 import coloredlogs
 import yaml
-from github import Github, Workflow, UnknownObjectException
-from github.Organization import Organization
-from github.PaginatedList import PaginatedList
+from github import Github, GithubRetry, UnknownObjectException
+from github.Repository import Repository
 
-from gha_cli.scanner import Org, print_orgs_as_csvs
+from gha_cli.cache import DEFAULT_TTL, DiskCache, json_loads
+from gha_cli.graphql import graphql
+from gha_cli.scanner import Org, get_viewer_orgs, print_orgs_as_csvs
+
+try:
+    from yaml import CSafeLoader as _SafeLoader
+except ImportError:  # PyYAML built without libyaml
+    from yaml import SafeLoader as _SafeLoader
 
 coloredlogs.install(level='INFO')
 logger = logging.getLogger()
 
-ActionVersion = namedtuple('ActionVersion', ['name', 'current', 'latest'])
+# `uses:` values of steps and jobs, scanned from the workflow text without parsing the YAML
+_USES_RE = re.compile(rb'''^\s*-?\s*uses:\s*["']?([^"'\s#]+)''', re.MULTILINE)
+# Block scalar headers (e.g., `run: |`), the lines of the block are more indented than the header line
+_BLOCK_SCALAR_RE = re.compile(rb'''^( *)[^\s#][^\n]*:[ \t]+[|>][1-9+-]*[ \t\r]*(?:#[^\n]*)?$''', re.MULTILINE)
+# Top-level (unindented) `name:` with a simple single-line value, anything else is left to the YAML parser
+_NAME_RE = re.compile(
+    rb'''^name:[ \t]*(?:"([^"\\\n]*)"|'([^'\n]*)'|([^\s"'#&*!|>%@`{\[?:,-][^\n]*?))'''
+    rb'''[ \t\r]*(?:[ \t]#[^\n]*)?$(?!\n[ \t]+\S)''',  # Not continued on the next line
+    re.MULTILINE)
+
+_SHA_RE = re.compile(r'[0-9a-f]{40}')
+_VERSION_PART_RE = re.compile(r'\d+')
+
+
+@dataclass(frozen=True)
+class ActionVersion:
+    __slots__ = ('name', 'current', 'latest')  # dataclass(slots=True) requires python 3.10
+    name: str
+    current: str
+    latest: Optional[str]
+
+
+FLAG_PARSE_WORKFLOW_YAML = False
+MAX_WORKERS = 8  # Concurrent GitHub API requests, kept low to avoid secondary rate limits
+RATE_LIMIT_LOW_WATERMARK = 100
+WORKFLOWS_PAGE_SIZE = 100
+GRAPHQL_BATCH_SIZE = 50  # Repositories per GraphQL query, keeps queries well under the node limit
+RETRY_BACKOFF_MAX = 30  # seconds
+
+
+class JitteredGithubRetry(GithubRetry):
+    """GithubRetry with a randomized exponential backoff capped at RETRY_BACKOFF_MAX,
+    so concurrent requests failing together do not retry in lockstep.
+    Rate limit waits (`Retry-After`, rate limit reset) are still set by GithubRetry and are not capped.
+    """
+
+    def get_backoff_time(self) -> float:
+        backoff = super().get_backoff_time()
+        return min(RETRY_BACKOFF_MAX, backoff + random.uniform(0, backoff))
+
+
+# Retry failed requests (5xx, rate limits) with exponential backoff and jitter
+API_RETRY = JitteredGithubRetry(total=5, backoff_factor=1)
+
+
+@functools.lru_cache(maxsize=4096)
+def _parse_version(version: str) -> Tuple[Optional[int], ...]:
+    """Parse a version such as `v1.2.3` to a tuple of ints.
+    Parts are parsed by their leading digits (`3-beta` is 3), parts without leading digits are parsed to None.
+    """
+    if version.startswith('v'):
+        version = version[1:]
+    return tuple(_major_version(part) for part in version.split('.'))
+
+
+def _major_version(version: str) -> Optional[int]:
+    m = _VERSION_PART_RE.match(version)
+    return int(m.group()) if m else None
+
+
+def _parse_uses(workflow_content: Union[str, bytes]) -> Set[str]:
+    """Collect the values of `uses` keys from the YAML events stream, without constructing the document
+    """
+    res = set()
+    collections: List[List[bool]] = []  # [is_mapping, expecting_key] per open collection
+    is_uses_value = False
+    for event in yaml.parse(workflow_content, Loader=_SafeLoader):
+        if isinstance(event, (yaml.MappingStartEvent, yaml.SequenceStartEvent)):
+            is_uses_value = False
+            collections.append([isinstance(event, yaml.MappingStartEvent), True])
+            continue
+        if isinstance(event, (yaml.MappingEndEvent, yaml.SequenceEndEvent)):
+            collections.pop()
+        elif isinstance(event, yaml.ScalarEvent):
+            if is_uses_value:
+                res.add(event.value)
+            is_key = bool(collections) and collections[-1][0] and collections[-1][1]
+            is_uses_value = is_key and event.value == 'uses'
+        elif isinstance(event, yaml.AliasEvent):
+            is_uses_value = False
+        else:  # stream/document events
+            continue
+        # A key or value node was completed in the parent mapping
+        if collections and collections[-1][0]:
+            collections[-1][1] = not collections[-1][1]
+    return res
+
+
+def _parse_name(workflow_content: Union[str, bytes]) -> Optional[str]:
+    """Get the top-level `name` of a workflow from the YAML events stream, stopping as soon as it is found
+    """
+    depth, expecting_key, is_name_value = 0, True, False
+    for event in yaml.parse(workflow_content, Loader=_SafeLoader):
+        if isinstance(event, (yaml.MappingStartEvent, yaml.SequenceStartEvent)):
+            if is_name_value or (depth == 0 and isinstance(event, yaml.SequenceStartEvent)):
+                return None
+            depth += 1
+            continue
+        if isinstance(event, (yaml.MappingEndEvent, yaml.SequenceEndEvent)):
+            depth -= 1
+            if depth == 0:
+                return None
+        elif isinstance(event, yaml.ScalarEvent):
+            if is_name_value:
+                return event.value
+            is_name_value = depth == 1 and expecting_key and event.value == 'name'
+        elif isinstance(event, yaml.AliasEvent):
+            if is_name_value:
+                return None
+        else:  # stream/document events
+            continue
+        # A key or value node was completed in the top-level mapping
+        if depth == 1:
+            expecting_key = not expecting_key
+    return None
+
 
-FLAG_COMPARE_EXACT_VERSION = False
+def _get_name(workflow_content: bytes) -> Optional[str]:
+    """Get the top-level `name` of a workflow, parsing the YAML only when the line is not a simple value
+    """
+    m = _NAME_RE.search(workflow_content)
+    if m is None:
+        return _parse_name(workflow_content)
+    return next(value for value in m.groups() if value is not None).decode()
+
+
+@functools.lru_cache(maxsize=64)
+def _block_scalar_lines_re(indent: int) -> re.Pattern:
+    return re.compile(rb'(?:\n(?:[ \t\r]*(?=\n|$)| {%d,}[^\n]*))*' % (indent + 1))
+
+
+def _in_block_scalar(workflow_content: bytes, positions: List[int]) -> bool:
+    """Whether any of the positions is inside a block scalar, e.g., a `run: |` script
+    """
+    for header in _BLOCK_SCALAR_RE.finditer(workflow_content):
+        end = _block_scalar_lines_re(len(header.group(1))).match(workflow_content, header.end()).end()
+        if any(header.end() < position <= end for position in positions):
+            return True
+    return False
+
+
+def _get_actions(workflow_content: bytes) -> Set[str]:
+    if not FLAG_PARSE_WORKFLOW_YAML:
+        matches = list(_USES_RE.finditer(workflow_content))
+        uses = [m.group(1) for m in matches]
+        # The scan does not capture expressions and block scalar values whole, misses flow style mappings
+        # (e.g., `- {uses: ...}`), and can not tell `uses:` lines inside scripts, parse these files as YAML
+        if not any(b'${{' in value or value.startswith((b'|', b'>')) for value in uses) \
+                and workflow_content.count(b'uses') == len(uses) \
+                and not _in_block_scalar(workflow_content, [m.start(1) for m in matches]):
+            return {value.decode() for value in uses}
+    return _parse_uses(workflow_content)
+
+
+def _is_sha(version: str) -> bool:
+    """Whether an action is pinned to a full commit SHA rather than a version tag
+    """
+    return len(version) == 40 and _SHA_RE.fullmatch(version if version.islower() else version.lower()) is not None
 
 
-def compare_versions(v1: str, v2: str) -> int:
+def _compare_major_versions(v1: str, v2: str) -> int:
+    """Compare the major versions of two versions, return 1 if v1 > v2, 0 if v1 == v2, -1 if v1 < v2
+    """
+    major1, major2 = _major_version(v1.removeprefix('v')), _major_version(v2.removeprefix('v'))
+    if major1 is None or major2 is None:
+        logging.warning('Could not compare versions %s and %s', v1, v2)
+        return 0
+    return (major1 > major2) - (major1 < major2)
+
+
+def _compare_exact_versions(v1: str, v2: str) -> int:
     """Compare two versions, return 1 if v1 > v2, 0 if v1 == v2, -1 if v1 < v2
     """
-    if v1.startswith('v'):
-        v1 = v1[1:]
-    if v2.startswith('v'):
-        v2 = v2[1:]
-    v1 = v1.split('.')
-    v2 = v2.split('.')
-    try:
-        compare_count = max(len(v1), len(v2)) if FLAG_COMPARE_EXACT_VERSION else 1
-        for i in range(compare_count):
-            v1_i = int(v1[i]) if i < len(v1) else 0
-            v2_i = int(v2[i]) if i < len(v2) else 0
-            if v1_i > v2_i:
-                return 1
-            if v1_i < v2_i:
-                return -1
-    except ValueError:
-        logging.warning(f'Could not compare versions {v1} and {v2}')
+    for part1, part2 in itertools.zip_longest(_parse_version(v1), _parse_version(v2), fillvalue=0):
+        # Parts after the first difference do not matter, even if they are not numbers
+        if part1 is None or part2 is None:
+            logging.warning('Could not compare versions %s and %s', v1, v2)
+            return 0
+        if part1 != part2:
+            return 1 if part1 > part2 else -1
     return 0
 
 
-class GithubActionsTools(object):
-    _wf_cache: dict[str, dict[str, Any]] = dict()  # repo_name -> [path -> workflow/yaml]
-    actions_latest_release: dict[str, str] = dict()  # action_name@current_release -> latest_release_tag
+def _make_compare(exact: bool) -> Callable[[str, str], int]:
+    return _compare_exact_versions if exact else _compare_major_versions
+
+
+# Compare two versions, return 1 if v1 > v2, 0 if v1 == v2, -1 if v1 < v2. Bound by the CLI to compare exact versions
+compare_versions = _make_compare(False)
 
-    def __init__(self, github_token: str):
-        self.client = Github(login_or_token=github_token)
+
+@functools.lru_cache(maxsize=128)
+def _is_local_repo(repo_name: str) -> bool:
+    return os.path.exists(repo_name) and os.path.exists(os.path.join(repo_name, '.git'))
+
+
+@functools.lru_cache(maxsize=128)
+def _list_full_paths(path: str) -> frozenset[str]:
+    try:
+        with os.scandir(path) as it:
+            return frozenset(entry.path
+                             for entry in it
+                             if entry.is_file() and entry.name.endswith(('.yml', '.yaml')))
+    except (FileNotFoundError, NotADirectoryError):
+        return frozenset()
+
+
+class GithubActionsTools(object):
+    def __init__(self, github_token: str, cache_ttl: int = DEFAULT_TTL):
+        # One pooled keep-alive connection per worker, so concurrent requests reuse TLS sessions
+        self.client = Github(login_or_token=github_token, pool_size=MAX_WORKERS, retry=API_RETRY)
+        self._wf_cache: dict[str, dict[str, dict[str, Any]]] = dict()  # repo_name -> [path -> {raw, sha}]
+        self._repo_cache: dict[str, Repository] = dict()  # repo_name -> repository
+        self.actions_latest_release: dict[str, Optional[str]] = dict()  # action_repo -> latest_release_tag
+        # GitHub GraphQL API is available only for authenticated requests
+        self.use_graphql = bool(github_token)
+        self._releases_cache = DiskCache('releases', cache_ttl)
+        self._responses_cache = DiskCache('responses', cache_ttl)
+        self._workflows_cache = DiskCache('workflows', cache_ttl)  # Workflow contents by blob sha, for GraphQL
 
     @staticmethod
     def is_local_repo(repo_name: str) -> bool:
-        return os.path.exists(repo_name) and os.path.exists(os.path.join(repo_name, '.git'))
+        return _is_local_repo(repo_name)
 
     @staticmethod
     def list_full_paths(path: str) -> set[str]:
-        if not os.path.exists(path):
-            return set()
-        return {os.path.join(path, file)
-                for file in os.listdir(path)
-                if file.endswith(('.yml', '.yaml'))}
+        return set(_list_full_paths(path))
 
     def get_workflow_actions(self, repo_name: str, workflow_path: str) -> Set[str]:
-        workflow_content = self._get_workflow_file_content(repo_name, workflow_path)
-        workflow = yaml.load(workflow_content, Loader=yaml.CLoader)
-        res = set()
-        for job in workflow.get('jobs', dict()).values():
-            for step in job.get('steps', list()):
-                if 'uses' in step:
-                    res.add(step['uses'])
+        return _get_actions(self._get_workflow_file_content(repo_name, workflow_path))
+
+    def scan_workflows(self, repo_name: str) -> Dict[str, Tuple[str, Set[str]]]:
+        """Read every workflow of a repository once, and get both its name and the actions it uses
+        """
+        workflow_paths = list(self._get_github_workflow_filenames(repo_name))
+        res = dict()
+        with ThreadPoolExecutor(max_workers=max(1, min(MAX_WORKERS, len(workflow_paths)))) as executor:
+            for path, scanned in zip(
+                    workflow_paths, executor.map(lambda p: self._scan_workflow(repo_name, p), workflow_paths)):
+                if scanned is not None:
+                    res[path] = scanned
         return res
 
+    def _scan_workflow(self, repo_name: str, workflow_path: str) -> Optional[Tuple[str, Set[str]]]:
+        try:
+            content = self._get_workflow_file_content(repo_name, workflow_path)
+        except FileNotFoundError as ex:
+            logging.warning(ex)
+            return None
+        return _get_name(content) or workflow_path, _get_actions(content)
+
+    @staticmethod
+    def action_repo_name(action_name: str) -> Optional[str]:
+        """Get the repository hosting an action, e.g., `actions/cache` for `actions/cache/restore`.
+        Returns None for local actions, docker images and malformed names.
+        """
+        parts = action_name.split('/')
+        if action_name.startswith(('.', 'docker://')) or len(parts) < 2:
+            return None
+        return '/'.join(parts[:2])
+
     def check_for_updates(self, action_name: str) -> Optional[str]:
         """Check whether an action has an update, and return the latest version if it does syntax for uses:
         https://docs.github.com/en/actions/using-workflows/workflow-syntax-for-github-actions#jobsjob_iduses
         """
-        if '@' not in action_name:
+        name, sep, current_version = action_name.partition('@')
+        if not sep:
             return None
-        repo_name, current_version = action_name.split('@')
-        logging.debug(f'Checking for updates for {action_name}: Getting repo {repo_name}')
-        if repo_name in self.actions_latest_release:
-            latest_release = self.actions_latest_release[repo_name]
-            logging.debug(f"Found in cache {repo_name}: {latest_release}")
-            return latest_release if compare_versions(latest_release, current_version) else None
-        repo = self.client.get_repo(repo_name)
-        logging.debug(f'Getting latest release for repository: {repo_name}')
-        try:
-            latest_release = repo.get_latest_release()
-            if compare_versions(latest_release.tag_name, current_version):
-                self.actions_latest_release[repo_name] = latest_release.tag_name
-                return latest_release.tag_name
-        except UnknownObjectException:
-            logging.warning(f'No releases found for repository: {repo_name}')
-        return None
+        return self._get_latest_release_for(name, current_version)
 
-    def get_repo_actions_latest(self, repo_name: str) -> Dict[str, List[ActionVersion]]:
-        workflow_paths = self._get_github_workflow_filenames(repo_name)
+    def check_for_updates_many(self, action_names: Iterable[str]) -> Dict[str, Optional[str]]:
+        """Check for updates of multiple actions, querying GitHub once per action repository.
+        Returns the latest version for every action that has an update, None for the others.
+        """
+        action_names = set(action_names)
+        action_versions = {action: action.partition('@') for action in action_names}
+        unique_action_repos = {
+            self.action_repo_name(name)
+            for name, sep, version in action_versions.values()
+            if sep and not _is_sha(version)}
+        unique_action_repos.discard(None)
+        self._fetch_latest_releases(unique_action_repos)
+        return {
+            action: self._get_latest_release_for(name, version) if sep else None
+            for action, (name, sep, version) in action_versions.items()}
+
+    def _get_latest_release_for(self, name: str, current_version: str) -> Optional[str]:
+        repo_name = self.action_repo_name(name)
+        if repo_name is None:
+            return None
+        if _is_sha(current_version):
+            logging.debug('%s@%s is pinned to a commit SHA, not checking for updates', name, current_version)
+            return None
+        latest_release = self._fetch_latest_release(repo_name)
+        if latest_release is None:
+            return None
+        return latest_release if compare_versions(latest_release, current_version) else None
+
+    def get_repo_actions_latest(
+            self, repo_name: str, workflows: Optional[Dict[str, Tuple[str, Set[str]]]] = None,
+    ) -> Dict[str, List[ActionVersion]]:
+        """Get the actions used by every workflow with their latest versions.
+        `workflows` is the result of scan_workflows, the repository is scanned when it is not provided.
+        """
+        # Phase 1: read and parse all workflows, files missing from the prefetch are fetched concurrently
+        if workflows is None:
+            workflows = self.scan_workflows(repo_name)
+        actions_per_path = {  # path -> [versioned actions]
+            path: [action for action in path_actions if '@' in action]
+            for path, (_, path_actions) in workflows.items()}
+        # Phase 2: query GitHub once per action repository, regardless of how many times/versions it is used
+        updates = self.check_for_updates_many(action for actions in actions_per_path.values() for action in actions)
+        # Phase 3: build the result from the resolved releases, no more API calls
         res = dict()
-        for path in workflow_paths:
+        for path, actions in actions_per_path.items():
             res[path] = list()
-            actions = self.get_workflow_actions(repo_name, path)
             for action in actions:
-                if '@' not in action:
-                    continue
-                action_name, curr_version = action.split('@')
-                if action not in self.actions_latest_release:
-                    latest = self.check_for_updates(action)
-                    self.actions_latest_release[action] = latest
-                else:
-                    latest = self.actions_latest_release[action]
-                res[path].append(ActionVersion(action_name, curr_version, latest))
+                action_name, _, curr_version = action.partition('@')
+                res[path].append(ActionVersion(action_name, curr_version, updates[action]))
         return res
 
     def get_repo_workflow_names(self, repo_name: str) -> Dict[str, str]:
@@ -120,8 +356,7 @@ class GithubActionsTools(object):
         for path in workflow_paths:
             try:
                 content = self._get_workflow_file_content(repo_name, path)
-                yaml_content = yaml.load(content, Loader=yaml.CLoader)
-                res[path] = yaml_content.get('name', path)
+                res[path] = _get_name(content) or path
             except FileNotFoundError as ex:
                 logging.warning(ex)
         return res
@@ -131,34 +366,126 @@ class GithubActionsTools(object):
             updates: List[ActionVersion],
             commit_msg: str,
     ) -> None:
-        workflow_content = self._get_workflow_file_content(repo_name, workflow_path)
-        if isinstance(workflow_content, bytes):
-            workflow_content = workflow_content.decode()
-        for update in updates:
-            if update.latest is None:
-                continue
-            current_action = f'{update.name}@{update.current}'
-            latest_action = f'{update.name}@{update.latest}'
-            workflow_content = workflow_content.replace(current_action, latest_action)
+        workflow_content = self._get_workflow_file_content(repo_name, workflow_path).decode()
+        mapping = {f'{u.name}@{u.current}': f'{u.name}@{u.latest}' for u in updates if u.latest is not None}
+        if mapping:
+            # Longest first and bounded, so `foo@v1` does not match inside `foo@v10` or `myfoo@v1`
+            pattern = re.compile(
+                r'(?<![\w./-])(?:' + '|'.join(map(re.escape, sorted(mapping, key=len, reverse=True))) + r')(?![\w.-])')
+            workflow_content = pattern.sub(lambda m: mapping[m.group(0)], workflow_content)
         self._update_workflow_content(repo_name, workflow_path, workflow_content, commit_msg)
 
+    def _get_repo(self, repo_name: str) -> Repository:
+        # Lazy: the repository is not fetched, it is only used as a handle for contents requests
+        if repo_name not in self._repo_cache:
+            self._repo_cache[repo_name] = self.client.get_repo(repo_name, lazy=True)
+        return self._repo_cache[repo_name]
+
+    def _fetch_latest_release(self, repo_name: str) -> Optional[str]:
+        """Get the latest release tag of a repository, GitHub is queried at most once per repository
+        """
+        if repo_name in self.actions_latest_release:
+            latest_release = self.actions_latest_release[repo_name]
+            logging.debug('Found in cache %s: %s', repo_name, latest_release)
+            return latest_release
+        self._fetch_latest_releases({repo_name})
+        return self.actions_latest_release[repo_name]
+
+    def _fetch_latest_releases(self, repo_names: Set[str]) -> None:
+        """Get the latest release tags of multiple repositories concurrently and cache them
+        """
+        pending = list()
+        for repo_name in repo_names:
+            if repo_name in self.actions_latest_release:
+                continue
+            entry = self._releases_cache.get(repo_name)
+            if self._releases_cache.is_fresh(entry):
+                self.actions_latest_release[repo_name] = entry['tag']
+            else:
+                pending.append(repo_name)
+        if not pending:
+            return
+        if self.use_graphql:
+            results = {repo_name: (tag, None) for repo_name, tag in self._batch_fetch_latest_releases(pending).items()}
+        else:
+            max_workers = min(MAX_WORKERS, len(pending))
+            # Remaining requests as of the last response, rate limit is only queried before the first request
+            if self.client.rate_limiting[0] < RATE_LIMIT_LOW_WATERMARK:
+                logging.warning('GitHub API rate limit is running low, fetching releases sequentially')
+                max_workers = 1
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                results = dict(zip(pending, executor.map(self._query_latest_release, pending)))
+        for repo_name, (tag, etag) in results.items():
+            self.actions_latest_release[repo_name] = tag
+            self._releases_cache.set(repo_name, tag=tag, etag=etag)
+
+    def _batch_fetch_latest_releases(self, repo_names: List[str]) -> Dict[str, Optional[str]]:
+        """Get the latest release tags of repositories using GraphQL, one request per GRAPHQL_BATCH_SIZE repositories,
+        batches are requested concurrently
+        """
+        batches = [repo_names[i:i + GRAPHQL_BATCH_SIZE] for i in range(0, len(repo_names), GRAPHQL_BATCH_SIZE)]
+        res = dict()
+        with ThreadPoolExecutor(max_workers=min(MAX_WORKERS, len(batches))) as executor:
+            for batch_res in executor.map(self._query_latest_releases_graphql, batches):
+                res.update(batch_res)
+        return res
+
+    def _query_latest_releases_graphql(self, repo_names: List[str]) -> Dict[str, Optional[str]]:
+        params, fields, variables = [], [], dict()
+        for j, repo_name in enumerate(repo_names):
+            owner, name = repo_name.split('/')
+            params.append(f'$o{j}: String!, $n{j}: String!')
+            fields.append(f'r{j}: repository(owner: $o{j}, name: $n{j}) {{ latestRelease {{ tagName }} }}')
+            variables.update({f'o{j}': owner, f'n{j}': name})
+        query = f'query({", ".join(params)}) {{ {" ".join(fields)} }}'
+        logging.debug('Getting latest releases for repositories: %s', repo_names)
+        data = graphql(self.client, query, variables)
+        res = dict()
+        for j, repo_name in enumerate(repo_names):
+            latest_release = (data.get(f'r{j}') or dict()).get('latestRelease')
+            if latest_release is None:
+                logging.warning('No releases found for repository: %s', repo_name)
+            res[repo_name] = latest_release['tagName'] if latest_release else None
+        return res
+
+    def _query_latest_release(self, repo_name: str) -> Tuple[Optional[str], Optional[str]]:
+        """Get the latest release tag of a repository and its ETag.
+        A cached ETag is revalidated, an unchanged release costs no rate limit and no payload.
+        """
+        cached = self._releases_cache.get(repo_name)
+        etag = cached.get('etag') if cached is not None else None
+        logging.debug('Getting latest release for repository: %s', repo_name)
+        try:
+            status, etag, data = self._get_json(f'/repos/{repo_name}/releases/latest', etag=etag)
+        except UnknownObjectException:
+            logging.warning('No releases found for repository: %s', repo_name)
+            return None, None
+        if status == 304:
+            logging.debug('Latest release for repository %s not modified', repo_name)
+            return cached['tag'], cached['etag']
+        return data['tag_name'], etag
+
     def _update_workflow_content(
             self, repo_name: str, workflow_path: str, workflow_content: str, commit_msg: str):
         if self.is_local_repo(repo_name):
-            with open(workflow_path, 'w') as f:
+            with open(workflow_path, 'w', newline='') as f:  # Keep the original line endings
                 f.write(workflow_content)
             click.secho(f'Updated workflow in {workflow_path}', fg='cyan')
             return
 
         # remote
-        repo = self.client.get_repo(repo_name)
-        current_content = repo.get_contents(workflow_path)
+        repo = self._get_repo(repo_name)
+        cached = self._wf_cache.get(repo_name, dict()).get(workflow_path)
+        sha = cached['sha'] if cached is not None and cached['sha'] is not None \
+            else repo.get_contents(workflow_path).sha
         res = repo.update_file(
             workflow_path,
             commit_msg,
             workflow_content,
-            current_content.sha,
+            sha,
         )
+        if cached is not None:
+            cached['raw'], cached['sha'] = workflow_content.encode(), res['content'].sha
         click.secho(f'Committed changes to workflow in {repo_name}:{workflow_path}', fg='cyan')
         return res
 
@@ -172,34 +499,148 @@ class GithubActionsTools(object):
             click.secho(f'{repo_name} is not a local repo and does not start with owner/repo', fg='red', err=True)
             raise ValueError(f'{repo_name} is not a local repo and does not start with owner/repo')
         # Remote
-        repo = self.client.get_repo(repo_name)
+        workflows, page = list(), 1
+        while True:
+            data = self._conditional_get(
+                f'/repos/{repo_name}/actions/workflows', {'per_page': WORKFLOWS_PAGE_SIZE, 'page': page},
+                keep=lambda d: {
+                    'total_count': d['total_count'], 'workflows': [{'path': wf['path']} for wf in d['workflows']]})
+            workflows.extend(data['workflows'])
+            if len(workflows) >= data['total_count'] or len(data['workflows']) == 0:
+                break
+            page += 1
         self._wf_cache[repo_name] = {
-            wf.path: wf
-            for wf in repo.get_workflows()
-            if wf.path.startswith('.github/')}
+            wf['path']: {'raw': None, 'sha': None}
+            for wf in workflows
+            if wf['path'].startswith('.github/')}
+        if self.use_graphql:
+            self._fetch_all_workflows_graphql(repo_name)
+        else:
+            self._prefetch_workflow_contents(repo_name)
         return set(self._wf_cache[repo_name].keys())
 
-    def _get_workflow_file_content(self, repo_name: str, workflow_path: str) -> Union[str, bytes]:
-        workflow_paths = self._get_github_workflow_filenames(repo_name)
+    def _prefetch_workflow_contents(self, repo_name: str) -> None:
+        """Fetch contents of all workflows of a remote repository to the cache concurrently
+        """
+        paths = list(self._wf_cache[repo_name].keys())
+        if not paths:
+            return
+        with ThreadPoolExecutor(max_workers=min(MAX_WORKERS, len(paths))) as executor:
+            for path, content in zip(paths, executor.map(lambda p: self._fetch_workflow_content(repo_name, p), paths)):
+                if content is not None:
+                    self._wf_cache[repo_name][path].update(raw=content[0], sha=content[1])
 
-        if self.is_local_repo(repo_name):
-            if not os.path.exists(workflow_path):
-                click.echo(
-                    f'f{workflow_path} not found in workflows for repository {repo_name}, '
-                    f'possible values: {workflow_paths}', err=True)
-            with open(workflow_path) as f:
-                return f.read()
-
-        if workflow_path not in workflow_paths:
-            click.echo(
-                f'f{workflow_path} not found in workflows for repository {repo_name}, '
-                f'possible values: {workflow_paths}', err=True)
-        repo = self.client.get_repo(repo_name)
+    def _fetch_workflow_content(self, repo_name: str, workflow_path: str) -> Optional[Tuple[bytes, str]]:
+        """Get the content and blob SHA of a remote workflow, None if it does not exist
+        """
         try:
-            workflow_content = repo.get_contents(workflow_path)
+            data = self._conditional_get(
+                f'/repos/{repo_name}/contents/{urllib.parse.quote(workflow_path)}',
+                keep=lambda d: {'content': d['content'], 'sha': d['sha']})
         except UnknownObjectException:
+            return None
+        return base64.b64decode(data['content']), data['sha']
+
+    def _fetch_all_workflows_graphql(self, repo_name: str) -> None:
+        """Fetch contents of all workflows of a remote repository to the cache, one request per batch of files.
+        Workflows cached by a previous run are only downloaded again when their blob changed.
+        """
+        wf_cache = self._wf_cache[repo_name]
+        paths = list(wf_cache.keys())
+        cached = {path: self._workflows_cache.get(f'{repo_name}:{path}') for path in paths}
+        if any(entry is not None for entry in cached.values()):
+            blobs = self._query_workflow_blobs(repo_name, paths, 'oid')
+            for path, blob in blobs.items():
+                entry = cached[path]
+                if entry is not None and entry['sha'] == blob['oid']:
+                    wf_cache[path].update(raw=entry['text'].encode(), sha=entry['sha'])
+                    self._workflows_cache.set(f'{repo_name}:{path}', sha=entry['sha'], text=entry['text'])
+            paths = [path for path in blobs if wf_cache[path]['raw'] is None]
+        for path, blob in self._query_workflow_blobs(repo_name, paths, 'text oid isTruncated isBinary').items():
+            # Large files are truncated by GraphQL, these are left to be fetched with the contents API
+            if blob.get('text') is not None and not blob['isTruncated'] and not blob['isBinary']:
+                wf_cache[path].update(raw=blob['text'].encode(), sha=blob['oid'])
+                self._workflows_cache.set(f'{repo_name}:{path}', sha=blob['oid'], text=blob['text'])
+
+    def _query_workflow_blobs(self, repo_name: str, paths: List[str], blob_fields: str) -> Dict[str, Dict[str, Any]]:
+        """Query fields of the blobs of workflows in the default branch, one request per GRAPHQL_BATCH_SIZE files.
+        Workflows that do not exist are omitted.
+        """
+        owner, name = repo_name.split('/')
+        res = dict()
+        for i in range(0, len(paths), GRAPHQL_BATCH_SIZE):
+            batch = paths[i:i + GRAPHQL_BATCH_SIZE]
+            params = ''.join(f', $e{j}: String!' for j in range(len(batch)))
+            fields = ' '.join(
+                f'w{j}: object(expression: $e{j}) {{ ... on Blob {{ {blob_fields} }} }}' for j in range(len(batch)))
+            query = (f'query($owner: String!, $name: String!{params}) '
+                     f'{{ repository(owner: $owner, name: $name) {{ {fields} }} }}')
+            variables = {f'e{j}': f'HEAD:{path}' for j, path in enumerate(batch)}
+            logging.debug('Getting workflows of repository %s: %s', repo_name, batch)
+            data = graphql(self.client, query, dict(variables, owner=owner, name=name))
+            repository = data.get('repository') or dict()
+            for j, path in enumerate(batch):
+                blob = repository.get(f'w{j}')
+                if blob is not None:
+                    res[path] = blob
+        return res
+
+    def _get_workflow_file_content(self, repo_name: str, workflow_path: str) -> bytes:
+        if self.is_local_repo(repo_name):
+            try:
+                with open(workflow_path, 'rb') as f:  # Parsed as bytes, no decoding needed
+                    return f.read()
+            except FileNotFoundError:
+                self._echo_workflow_not_found(repo_name, workflow_path)
+                raise
+
+        cached = self._wf_cache.get(repo_name, dict()).get(workflow_path)
+        if cached is not None and cached['raw'] is not None:
+            return cached['raw']
+        content = self._fetch_workflow_content(repo_name, workflow_path)
+        if content is None:
+            self._echo_workflow_not_found(repo_name, workflow_path)
             raise FileNotFoundError(f'Workflow not found in repository: {repo_name}, path: {workflow_path}')
-        return workflow_content.decoded_content
+        if cached is not None:
+            cached['raw'], cached['sha'] = content
+        return content[0]
+
+    def _echo_workflow_not_found(self, repo_name: str, workflow_path: str) -> None:
+        workflow_paths = self._get_github_workflow_filenames(repo_name)
+        click.echo(
+            f'{workflow_path} not found in workflows for repository {repo_name}, '
+            f'possible values: {workflow_paths}', err=True)
+
+    def _conditional_get(
+            self, url: str, parameters: Optional[Dict[str, Any]] = None, keep: Callable[[Any], Any] = lambda d: d,
+    ) -> Any:
+        """GET a GitHub API url, revalidating a previously cached response using its ETag.
+        An unchanged response (304) costs no rate limit and no payload.
+        Only the part of the response returned by `keep` is cached and returned.
+        """
+        key = f'{url}?{urllib.parse.urlencode(parameters)}' if parameters else url
+        cached = self._responses_cache.get(key)
+        status, etag, data = self._get_json(url, parameters, cached.get('etag') if cached is not None else None)
+        if status == 304:
+            logging.debug('Not modified: %s', key)
+            etag, data = cached['etag'], cached['data']
+        else:
+            data = keep(data)
+        self._responses_cache.set(key, etag=etag, data=data)  # Also keeps a revalidated entry from expiring
+        return data
+
+    def _get_json(
+            self, url: str, parameters: Optional[Dict[str, Any]] = None, etag: Optional[str] = None,
+    ) -> Tuple[int, Optional[str], Any]:
+        """GET a GitHub API url, conditionally when an ETag is provided, return the status, ETag and JSON response
+        """
+        headers = {'If-None-Match': etag} if etag else None
+        status, response_headers, output = self.client.requester.requestJson(
+            'GET', url, parameters=parameters, headers=headers)
+        data = json_loads(output) if output else None
+        if status >= 400:
+            raise self.client.requester.createException(status, response_headers, data)
+        return status, response_headers.get('etag'), data
 
 
 GITHUB_ACTION_NOT_PROVIDED_MSG = """GitHub connection token not provided.
@@ -220,18 +661,29 @@ You can provide it using GITHUB_TOKEN environment variable or --github-token opt
 @click.option(
     '--compare-exact-versions', is_flag=True, default=False,
     help="Compare versions using all semantic and not only major versions, e.g., v1 will be upgraded to v1.2.3", )
+@click.option(
+    '--parse-yaml', is_flag=True, default=False,
+    help="Find actions by parsing workflows as YAML instead of scanning for `uses:` lines, slower but stricter", )
+@click.option(
+    '--cache-ttl', default=DEFAULT_TTL, type=click.IntRange(min=0), show_default=True,
+    help="Seconds to reuse cached latest releases of actions without asking GitHub, 0 to always ask", )
 @click.pass_context
-def cli(ctx, verbose: int, repo: str, github_token: Optional[str], compare_exact_versions: bool):
+def cli(
+        ctx, verbose: int, repo: str, github_token: Optional[str], compare_exact_versions: bool, parse_yaml: bool,
+        cache_ttl: int,
+):
     if verbose == 1:
         coloredlogs.install(level='INFO')
     if verbose > 1:
         coloredlogs.install(level='DEBUG')
     ctx.ensure_object(dict)
-    global FLAG_COMPARE_EXACT_VERSION
-    FLAG_COMPARE_EXACT_VERSION = compare_exact_versions
+    global compare_versions
+    compare_versions = _make_compare(compare_exact_versions)
+    global FLAG_PARSE_WORKFLOW_YAML
+    FLAG_PARSE_WORKFLOW_YAML = parse_yaml
     if not github_token:
         click.secho(GITHUB_ACTION_NOT_PROVIDED_MSG, fg='yellow', err=True)
-    ctx.obj['gh'] = GithubActionsTools(github_token)
+    ctx.obj['gh'] = GithubActionsTools(github_token, cache_ttl)
     ctx.obj['repo'] = repo
     if not ctx.invoked_subcommand:
         ctx.invoke(update_actions)
@@ -248,23 +700,28 @@ def cli(ctx, verbose: int, repo: str, github_token: Optional[str], compare_exact
 @click.pass_context
 def update_actions(ctx, update: bool, commit_msg: str):
     gh, repo = ctx.obj['gh'], ctx.obj['repo']
-    workflow_names = (gh.get_repo_workflow_names(repo))
-    workflow_action_versions = gh.get_repo_actions_latest(repo)
-    max_action_name_length, max_version_length = 0, 0
-    for workflow_path, actions in workflow_action_versions.items():
-        for action in workflow_action_versions[workflow_path]:
-            max_action_name_length = max(max_action_name_length, len(action.name))
-            max_version_length = max(max_version_length, len(action.current))
-    for workflow_path, workflow_name in workflow_names.items():
-        click.secho(f'{workflow_path} ({click.style(workflow_name, fg="bright_cyan")}):', fg='bright_blue')
-        for action in workflow_action_versions[workflow_path]:
+    workflows = gh.scan_workflows(repo)
+    workflow_names = {path: name for path, (name, _) in workflows.items()}
+    workflow_action_versions = gh.get_repo_actions_latest(repo, workflows)
+    all_actions = [action for actions in workflow_action_versions.values() for action in actions]
+    max_action_name_length = max((len(action.name) for action in all_actions), default=0)
+    max_version_length = max((len(action.current) for action in all_actions), default=0)
+    # ANSI sequences are computed once rather than styling every action
+    major_update, minor_update, reset = (
+        click.style('', fg='red', reset=False), click.style('', fg='cyan', reset=False), click.style(''))
+    lines = list()
+    for workflow_path in sorted(workflow_names):
+        lines.append(click.style(
+            f'{workflow_path} ({click.style(workflow_names[workflow_path], fg="bright_cyan")}):', fg='bright_blue'))
+        for action in sorted(workflow_action_versions.get(workflow_path, []), key=lambda a: (a.name, a.current)):
             s = f'\t{action.name:<{max_action_name_length + 5}} {action.current:>{max_version_length + 2}}'
             if action.latest:
-                old_version = action.current.split('.')
-                new_version = action.latest.split('.')
-                color = 'red' if new_version[0] != old_version[0] else 'cyan'
-                s += ' ==> ' + click.style(f'{action.latest}', fg=color)
-            click.echo(s)
+                color = major_update if action.latest.partition('.')[0] != action.current.partition('.')[0] \
+                    else minor_update
+                s += f' ==> {color}{action.latest}{reset}'
+            lines.append(s)
+    if lines:
+        click.echo('\n'.join(lines))
     if not update:
         return
     for workflow in workflow_action_versions:
@@ -295,15 +752,7 @@ def analyze_orgs(ctx, exclude: Set[str] = None):
     gh_client: Github = ctx.obj['gh'].client
     exclude = exclude or {}
     exclude = set(exclude)
-    current_user = gh_client.get_user()
-    gh_orgs: PaginatedList[Organization] = current_user.get_orgs()
-    logging.info(f'Analyzing {gh_orgs.totalCount} organizations')
-    orgs: List[Org] = []
-    for gh_org in gh_orgs:
-        if gh_org.login in exclude:
-            continue
-        org = Org.from_github_org(gh_org)
-        orgs.append(org)
+    orgs: List[Org] = get_viewer_orgs(gh_client, exclude)
     print_orgs_as_csvs(orgs)
 
 
@@ -0,0 +1,20 @@
+import logging
+from typing import Any, Dict, Optional
+
+from github import Github, GithubException
+
+logger = logging.getLogger()
+
+
+def graphql(client: Github, query: str, variables: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Run a GraphQL query and return its `data`.
+    Errors on individual nodes (e.g., a repository that does not exist) are logged and the nodes are null.
+    """
+    requester = client.requester
+    headers, response = requester.requestJsonAndCheck(
+        'POST', requester.graphql_url, input={'query': query, 'variables': variables or {}})
+    if response.get('data') is None:
+        raise GithubException(400, response, headers)
+    for error in response.get('errors', []):
+        logger.debug('GraphQL error: %s', error.get('message'))
+    return response['data']
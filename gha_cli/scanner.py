@@ -1,23 +1,30 @@
+import csv
+import functools
 import logging
 from dataclasses import dataclass, fields
-from datetime import datetime, timedelta
-from typing import List
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Set, Tuple
 
 import click
-from github.Organization import Organization
-from github.PaginatedList import PaginatedList
-from github.Repository import Repository
+from github import Github
+
+from gha_cli.graphql import graphql
 
 logger = logging.getLogger()
 
+REPOS_PAGE_SIZE = 50  # Repositories per GraphQL query, keeps queries well under the node limit
+
 
 @dataclass
 class CsvClass:
     IGNORE_FIELDS = []
 
-    def get_attributes(self) -> List[str]:
-        return [a.name for a in fields(self.__class__)
-                if a.name not in self.IGNORE_FIELDS]
+    @classmethod
+    @functools.lru_cache(maxsize=None)
+    def get_attributes(cls) -> Tuple[str, ...]:
+        """Names of the CSV columns, computed once per class
+        """
+        return tuple(a.name for a in fields(cls) if a.name not in cls.IGNORE_FIELDS)
 
     def csv_header(self) -> str:
         return ','.join(self.get_attributes())
@@ -25,6 +32,9 @@ class CsvClass:
     def csv_str(self) -> str:
         return ','.join([str(getattr(self, attr)) for attr in self.get_attributes()])
 
+    def csv_row(self) -> List[Any]:
+        return [getattr(self, attr) for attr in self.get_attributes()]
+
 
 @dataclass
 class Repo(CsvClass):
@@ -42,20 +52,22 @@ class Repo(CsvClass):
     forks_count: int = 0
 
     @classmethod
-    def from_github_repo(cls, repo: Repository):
+    def from_graphql_node(cls, node: Dict[str, Any]):
+        default_branch = node['defaultBranchRef']  # None for empty repositories
+        collaborators = node['collaborators']  # None without push access to the repository
         return cls(
-            name=repo.name,
-            is_private=repo.private,
-            is_archived=repo.archived,
-            branches_count=repo.get_branches().totalCount,
-            collaborators_count=repo.get_collaborators().totalCount,
-            is_active=repo.get_commits(since=datetime.now() - timedelta(days=365)).totalCount > 0,
-            has_issues=repo.has_issues,
-            has_pull_requests=repo.get_pulls().totalCount > 0,
-            size=repo.size,
-            large_repo=repo.size > 1024 * 1024,
-            is_template=repo.is_template,
-            forks_count=repo.forks_count,
+            name=node['name'],
+            is_private=node['isPrivate'],
+            is_archived=node['isArchived'],
+            branches_count=node['refs']['totalCount'],
+            collaborators_count=collaborators['totalCount'] if collaborators is not None else 0,
+            is_active=default_branch is not None and default_branch['target']['history']['totalCount'] > 0,
+            has_issues=node['hasIssuesEnabled'],
+            has_pull_requests=node['pullRequests']['totalCount'] > 0,
+            size=node['diskUsage'] or 0,
+            large_repo=(node['diskUsage'] or 0) > 1024 * 1024,
+            is_template=node['isTemplate'],
+            forks_count=node['forkCount'],
         )
 
 
@@ -72,33 +84,87 @@ class Org(CsvClass):
         self.repositories_count = len(self.repositories)
 
     @classmethod
-    def from_github_org(cls, org: Organization):
-        gh_repositories: PaginatedList[Repository] = org.get_repos()
-        repositories: List[Repo] = []
-        for gh_repo in gh_repositories:
-            repo = Repo.from_github_repo(gh_repo)
-            repositories.append(repo)
-
+    def from_graphql_node(cls, client: Github, node: Dict[str, Any]):
         return cls(
-            name=org.name,
-            repositories=repositories,
-            members_count=org.get_members().totalCount,
-            teams_count=org.get_teams().totalCount,
+            name=node['name'],
+            repositories=get_org_repos_graphql(client, node['login']),
+            members_count=node['membersWithRole']['totalCount'],
+            teams_count=node['teams']['totalCount'],
         )
 
 
+ORG_REPOS_QUERY = """
+query($login: String!, $cursor: String, $pageSize: Int!, $since: GitTimestamp!) {
+  organization(login: $login) {
+    repositories(first: $pageSize, after: $cursor) {
+      pageInfo { hasNextPage endCursor }
+      nodes {
+        name isPrivate isArchived hasIssuesEnabled diskUsage isTemplate forkCount
+        refs(refPrefix: "refs/heads/") { totalCount }
+        collaborators { totalCount }
+        pullRequests(states: OPEN) { totalCount }
+        defaultBranchRef { target { ... on Commit { history(since: $since) { totalCount } } } }
+      }
+    }
+  }
+}
+"""
+
+
+def get_org_repos_graphql(client: Github, login: str) -> List[Repo]:
+    """Get the repositories of an organization, one GraphQL request per REPOS_PAGE_SIZE repositories
+    instead of a few REST requests per repository
+    """
+    since = (datetime.now(timezone.utc) - timedelta(days=365)).strftime('%Y-%m-%dT%H:%M:%SZ')
+    repositories, cursor = [], None
+    while True:
+        data = graphql(client, ORG_REPOS_QUERY, {
+            'login': login, 'cursor': cursor, 'pageSize': REPOS_PAGE_SIZE, 'since': since,
+        })['organization']['repositories']
+        repositories.extend(Repo.from_graphql_node(node) for node in data['nodes'] if node is not None)
+        if not data['pageInfo']['hasNextPage']:
+            return repositories
+        cursor = data['pageInfo']['endCursor']
+
+
+VIEWER_ORGS_QUERY = """
+query($cursor: String) {
+  viewer {
+    organizations(first: 100, after: $cursor) {
+      pageInfo { hasNextPage endCursor }
+      nodes { login name membersWithRole { totalCount } teams { totalCount } }
+    }
+  }
+}
+"""
+
+
+def get_viewer_orgs(client: Github, exclude: Set[str]) -> List[Org]:
+    """Get the organizations of the authenticated user, one GraphQL request per 100 organizations
+    """
+    nodes, cursor = [], None
+    while True:
+        data = graphql(client, VIEWER_ORGS_QUERY, {'cursor': cursor})['viewer']['organizations']
+        nodes.extend(data['nodes'])
+        if not data['pageInfo']['hasNextPage']:
+            break
+        cursor = data['pageInfo']['endCursor']
+    logger.info('Analyzing %s organizations', len(nodes))
+    return [Org.from_graphql_node(client, node) for node in nodes if node['login'] not in exclude]
+
+
 def print_orgs_as_csvs(orgs: List[Org]):
     if len(orgs) == 0:
         return
 
-    click.echo(orgs[0].csv_header())
-    for org in orgs:
-        click.echo(org.csv_str())
+    # csv quotes values containing commas (e.g., organization names), and writes rows without per-row echo overhead
+    writer = csv.writer(click.get_text_stream('stdout'), lineterminator='\n')
+    writer.writerow(Org.get_attributes())
+    writer.writerows(org.csv_row() for org in orgs)
 
     for org in orgs:
-        logger.info(f'Analyzing repos for {org.name}')
+        logger.info('Analyzing repos for %s', org.name)
         if len(org.repositories) == 0:
             continue
-        click.echo(org.repositories[0].csv_header())
-        for repo in org.repositories:
-            click.echo(repo.csv_str())
+        writer.writerow(Repo.get_attributes())
+        writer.writerows(repo.csv_row() for repo in org.repositories)